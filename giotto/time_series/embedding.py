@@ -2,15 +2,73 @@
 # License: Apache 2.0
 
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from numba import njit
 from sklearn.base import BaseEstimator
+from sklearn.exceptions import NotFittedError
 from ..base import TransformerResamplerMixin
 from sklearn.metrics import mutual_info_score
-from sklearn.neighbors import NearestNeighbors
+from sklearn.neighbors import KDTree
 from joblib import Parallel, delayed
-from sklearn.utils.validation import check_is_fitted, check_array, column_or_1d
+from sklearn.utils import assert_all_finite
+from sklearn.utils.validation import check_array, column_or_1d
 from ..utils.validation import validate_params
 
 
+@njit('int64(float64[:], int64[:, :], float64[:], int64, float64, float64)',
+      nogil=True, cache=True)
+def _fnn_count(X, indices, distance, dim_by_delay, epsilon, tolerance):
+    """Count the false nearest neighbor pairs given the output of a
+    2-nearest neighbors query on the embedded point cloud.
+
+    Each coordinate difference along the next delay is tested against the
+    distance of every point lying within `epsilon`, i.e. the count is the
+    number of pairs (a, b) such that ``0 < distance[b] < epsilon`` and
+    ``|diff[a]| > tolerance * distance[b]``. Sorting the differences makes
+    this O(n log n) instead of building the full (n, n) criterion matrix.
+
+    """
+    n_points = distance.shape[0] - dim_by_delay
+    if n_points <= 0:
+        return 0
+    offset = X.shape[0] - distance.shape[0]
+
+    diff = np.empty(n_points)
+    for i in range(n_points):
+        diff[i] = abs(X[offset + i + dim_by_delay] -
+                      X[indices[i + dim_by_delay, 1]])
+    diff.sort()
+
+    n_false_neighbors = 0
+    for i in range(n_points):
+        d = distance[i]
+        if d <= 0 or d >= epsilon:
+            continue
+        n_false_neighbors += n_points - np.searchsorted(
+            diff, tolerance * d, side='right')
+    return n_false_neighbors
+
+
+def _maybe_parallel(func, args_list, n_jobs):
+    """Call `func` on each tuple of positional arguments in `args_list`, on
+    joblib threads if `n_jobs` asks for more than one job and in a plain
+    loop otherwise."""
+    if n_jobs in (None, 1):
+        return [func(*args) for args in args_list]
+    return Parallel(n_jobs=n_jobs, require='sharedmem')(
+        delayed(func)(*args) for args in args_list)
+
+
+def _check_is_fitted(estimator):
+    """Lightweight version of :func:`sklearn.utils.validation.check_is_fitted`
+    for estimators which set ``_is_fitted`` at the end of :meth:`fit`."""
+    if not getattr(estimator, '_is_fitted', False):
+        raise NotFittedError(
+            "This {} instance is not fitted yet. Call 'fit' with "
+            "appropriate arguments before using this method."
+            .format(type(estimator).__name__))
+
+
 class SlidingWindow(BaseEstimator, TransformerResamplerMixin):
     """Sliding windows onto the data.
 
@@ -74,16 +132,6 @@ class SlidingWindow(BaseEstimator, TransformerResamplerMixin):
         self.width = width
         self.stride = stride
 
-    def _slice_windows(self, X):
-        n_samples = X.shape[0]
-        n_windows = (n_samples - self.width - 1) // self.stride + 1
-
-        window_slices = [(n_samples - i * self.stride - self.width - 1,
-                          n_samples - i * self.stride)
-                         for i in reversed(range(n_windows))]
-
-        return window_slices
-
     def fit(self, X, y=None):
         """Do nothing and return the estimator unchanged.
 
@@ -125,16 +173,27 @@ class SlidingWindow(BaseEstimator, TransformerResamplerMixin):
         Xt : ndarray, shape (n_windows, n_samples_window, ...)
             Windows of consecutive entries of the original time series.
             ``n_windows = (n_samples - width - 1) // stride  + 1``, and
-            ``n_samples_window = width + 1``.
+            ``n_samples_window = width + 1``. This is a read-only view on
+            `X`, so no data is copied.
 
         """
         # Check if fit had been called
-        check_is_fitted(self, ['_is_fitted'])
-        X = check_array(X, ensure_2d=False, allow_nd=True)
+        _check_is_fitted(self)
+        if isinstance(X, np.ndarray) and X.dtype.kind in 'fiu' and \
+                X.flags.c_contiguous:
+            assert_all_finite(X)
+        else:
+            X = check_array(X, ensure_2d=False, allow_nd=True)
 
-        window_slices = self._slice_windows(X)
+        n_samples = X.shape[0]
+        n_windows = (n_samples - self.width - 1) // self.stride + 1
+        start = n_samples - (n_windows - 1) * self.stride - self.width - 1
 
-        Xt = np.stack([X[begin:end] for begin, end in window_slices])
+        # Read-only view on X: windows share memory with the input
+        Xt = as_strided(X[start:],
+                        shape=(n_windows, self.width + 1) + X.shape[1:],
+                        strides=(self.stride * X.strides[0],) + X.strides,
+                        writeable=False)
         return Xt
 
     def resample(self, y, X=None):
@@ -159,11 +218,12 @@ class SlidingWindow(BaseEstimator, TransformerResamplerMixin):
 
         """
         # Check if fit had been called
-        check_is_fitted(self, ['_is_fitted'])
-        yr = column_or_1d(y)
+        _check_is_fitted(self)
+        if not (isinstance(y, np.ndarray) and y.ndim == 1):
+            y = column_or_1d(y)
 
-        yr = np.flip(yr)
-        yr = np.flip(yr[:-self.width:self.stride])
+        start = self.width + (y.shape[0] - 1 - self.width) % self.stride
+        yr = np.ascontiguousarray(y[start::self.stride])
         return yr
 
 
@@ -302,56 +362,55 @@ class TakensEmbedding(BaseEstimator, TransformerResamplerMixin):
 
     @staticmethod
     def _embed(X, time_delay, dimension, stride):
-        n_points = (X.shape[0] - time_delay * (dimension - 1) - 1)\
-                   // stride + 1
+        X = X.ravel()
+        span = time_delay * (dimension - 1) + 1
+        n_points = (X.shape[0] - span) // stride + 1
+        start = X.shape[0] - (n_points - 1) * stride - span
+
+        X_embedded = as_strided(X[start:], shape=(n_points, dimension),
+                                strides=(stride * X.strides[0],
+                                         time_delay * X.strides[0]),
+                                writeable=False)
 
-        X = np.flip(X)
-        points_ = [X[j * stride:j * stride + time_delay * dimension:time_delay]
-                   .flatten() for j in range(n_points)]
-        X_embedded = np.stack(points_)
+        return np.ascontiguousarray(X_embedded)
 
-        return np.flip(X_embedded).reshape(n_points, dimension)
+    @staticmethod
+    def _bin(X, n_bins):
+        """Assign each sample to one of `n_bins` equal-width bins spanning
+        the range of `X`, and return the bin indices."""
+        X_min, X_max = X.min(), X.max()
+        scale = n_bins / (X_max - X_min) if X_max > X_min else 0.
+        X_binned = np.minimum(((X - X_min) * scale).astype(np.intp),
+                              n_bins - 1)
+        return X_binned
 
     @staticmethod
-    def _mutual_information(X, time_delay, n_bins):
-        """Calculate the mutual information given the delay."""
-        contingency = np.histogram2d(X.reshape((-1,))[:-time_delay],
-                                     X.reshape((-1,))[time_delay:],
-                                     bins=n_bins)[0]
+    def _mutual_information(X_binned, time_delay, n_bins):
+        """Calculate the mutual information given the delay, from the bin
+        index of each sample."""
+        X_flat = X_binned[:-time_delay] * n_bins + X_binned[time_delay:]
+        contingency = np.bincount(X_flat, minlength=n_bins * n_bins)\
+            .reshape(n_bins, n_bins)
         mutual_information = mutual_info_score(None, None,
                                                contingency=contingency)
         return mutual_information
 
     @staticmethod
-    def _false_nearest_neighbors(X, time_delay, dimension,
+    def _false_nearest_neighbors(X, time_delay, dimension, epsilon,
                                  stride=1):
         """Calculate the number of false nearest neighbours of embedding
-        dimension. """
+        dimension, given a 1D time series `X` and the radius `epsilon`
+        limiting the neighbors which are tested."""
         X_embedded = TakensEmbedding._embed(X, time_delay, dimension, stride)
 
-        neighbor = NearestNeighbors(n_neighbors=2, algorithm='auto').fit(
-            X_embedded)
-        distances, indices = neighbor.kneighbors(X_embedded)
-        distance = distances[:, 1]
-        XNeighbor = X[indices[:, 1]]
-
-        epsilon = 2.0 * np.std(X)
-        tolerance = 10
-
-        dim_by_delay = -dimension * time_delay
-        non_zero_distance = distance[:dim_by_delay] > 0
+        tree = KDTree(X_embedded, leaf_size=40)
+        distances, indices = tree.query(X_embedded, k=2)
 
-        false_neighbor_criteria = \
-            np.abs(np.roll(X, dim_by_delay)[
-                   X.shape[0] - X_embedded.shape[0]:dim_by_delay] -
-                   np.roll(XNeighbor, dim_by_delay)[:dim_by_delay]) \
-            / distance[:dim_by_delay] > tolerance
+        tolerance = 10.
 
-        limited_dataset_criteria = distance[:dim_by_delay] < epsilon
-
-        n_false_neighbors = np.sum(
-            non_zero_distance * false_neighbor_criteria *
-            limited_dataset_criteria)
+        n_false_neighbors = _fnn_count(X, indices.astype(np.int64, copy=False),
+                                       distances[:, 1], dimension * time_delay,
+                                       epsilon, tolerance)
         return n_false_neighbors
 
     def fit(self, X, y=None):
@@ -377,31 +436,35 @@ class TakensEmbedding(BaseEstimator, TransformerResamplerMixin):
         """
         validate_params(self.get_params(), self._hyperparameters)
         X = check_array(X, ensure_2d=False)
-        if X.ndim == 1:
-            X = X[:, None]
 
         if self.parameters_type == 'search':
-            mutual_information_list = Parallel(n_jobs=self.n_jobs)(
-                delayed(self._mutual_information)(X, time_delay, n_bins=100)
-                for time_delay in range(1, self.time_delay + 1))
+            X_flat = X.ravel().astype(np.float64, copy=False)
+
+            n_bins = 100
+            X_binned = self._bin(X_flat, n_bins)
+            mutual_information_list = [
+                self._mutual_information(X_binned, time_delay, n_bins)
+                for time_delay in range(1, self.time_delay + 1)]
             self.time_delay_ = mutual_information_list.index(
                 min(mutual_information_list)) + 1
 
-            n_false_nbhrs_list = Parallel(n_jobs=self.n_jobs)(
-                delayed(self._false_nearest_neighbors)(
-                    X, self.time_delay_, dim, stride=1)
-                for dim in range(1, self.dimension + 3))
-            variation_list = [np.abs(n_false_nbhrs_list[dim - 1]
-                                     - 2 * n_false_nbhrs_list[dim] +
-                                     n_false_nbhrs_list[dim + 1])
-                              / (n_false_nbhrs_list[dim] + 1) / dim
-                              for dim in range(2, self.dimension + 1)]
-            self.dimension_ = variation_list.index(min(variation_list)) + 2
+            epsilon = 2.0 * np.std(X_flat)
+            n_false_nbhrs_list = _maybe_parallel(
+                self._false_nearest_neighbors,
+                [(X_flat, self.time_delay_, dim, epsilon)
+                 for dim in range(1, self.dimension + 3)], self.n_jobs)
+            n_false_nbhrs = np.asarray(n_false_nbhrs_list, dtype=np.float64)
+            variation = np.abs(n_false_nbhrs[1:-2] - 2 * n_false_nbhrs[2:-1] +
+                               n_false_nbhrs[3:]) \
+                / (n_false_nbhrs[2:-1] + 1) / np.arange(2, self.dimension + 1)
+            self.dimension_ = int(np.argmin(variation)) + 2
 
         else:
             self.time_delay_ = self.time_delay
             self.dimension_ = self.dimension
 
+        self._y_start_offset = self.time_delay_ * (self.dimension_ - 1)
+        self._is_fitted = True
         return self
 
     def transform(self, X, y=None):
@@ -424,11 +487,18 @@ class TakensEmbedding(BaseEstimator, TransformerResamplerMixin):
 
         """
         # Check if fit had been called
-        check_is_fitted(self, ['time_delay_', 'dimension_'])
-        Xt = check_array(X, ensure_2d=False)
-        if Xt.ndim == 1:
-            Xt = Xt[:, None]
-        Xt = self._embed(Xt, self.time_delay_, self.dimension_, self.stride)
+        _check_is_fitted(self)
+        if isinstance(X, np.ndarray) and X.dtype.kind in 'fiu' and \
+                X.flags.c_contiguous:
+            assert_all_finite(X)
+        else:
+            X = check_array(X, ensure_2d=False)
+        if not (X.ndim == 1 or (X.ndim == 2 and X.shape[1] == 1)):
+            raise ValueError("Expected a univariate time series of shape "
+                             "(n_samples,) or (n_samples, 1), got shape {}."
+                             .format(X.shape))
+
+        Xt = self._embed(X, self.time_delay_, self.dimension_, self.stride)
 
         return Xt
 
@@ -454,10 +524,11 @@ class TakensEmbedding(BaseEstimator, TransformerResamplerMixin):
 
         """
         # Check if fit had been called
-        check_is_fitted(self, ['time_delay_', 'dimension_'])
-        yr = column_or_1d(y)
+        _check_is_fitted(self)
+        if not (isinstance(y, np.ndarray) and y.ndim == 1):
+            y = column_or_1d(y)
 
-        yr = np.flip(yr)
-        final_index = -self.time_delay_ * (self.dimension_ - 1)
-        yr = np.flip(yr[:final_index:self.stride])
+        start = self._y_start_offset + \
+            (y.shape[0] - 1 - self._y_start_offset) % self.stride
+        yr = np.ascontiguousarray(y[start::self.stride])
         return yr
@@ -5,9 +5,11 @@ import numpy as np
 import pytest
 from numpy.testing import assert_almost_equal
 from sklearn.exceptions import NotFittedError
+from sklearn.metrics import mutual_info_score
 
 from giotto.time_series import TakensEmbedding
 from giotto.time_series import SlidingWindow
+from giotto.time_series.embedding import _fnn_count
 
 signal = np.asarray([np.sin(x / 2) + 2 for x in range(0, 20)])
 
@@ -63,6 +65,17 @@ def test_embedder_not_fitted():
         embedder.transform(signal)
 
 
+@pytest.mark.parametrize("X", [np.array([1., np.nan, 3., 4., 5.]),
+                               np.array([1., 2., np.inf, 4., 5.]),
+                               np.arange(12).reshape(6, 2),
+                               np.arange(12).reshape(3, 2, 2)])
+def test_embedder_transform_invalid(X):
+    embedder = TakensEmbedding(parameters_type='fixed', time_delay=1,
+                               dimension=2).fit(signal)
+    with pytest.raises(ValueError):
+        embedder.transform(X)
+
+
 @pytest.mark.parametrize("parameters_type, expected",
                          [('search', signal_embedded_search),
                           ('fixed', signal_embedded_fixed)])
@@ -72,7 +85,126 @@ def test_embedder_transform(parameters_type, expected):
     assert_almost_equal(embedder.fit_transform(signal), expected)
 
 
+def test_embedder_n_jobs():
+    X = np.sin(np.arange(500) / 10) + \
+        0.1 * np.random.RandomState(0).rand(500)
+    embedder_serial = TakensEmbedding(parameters_type='search',
+                                      time_delay=3, dimension=5).fit(X)
+    embedder_parallel = TakensEmbedding(parameters_type='search',
+                                        time_delay=3, dimension=5,
+                                        n_jobs=2).fit(X)
+
+    assert embedder_parallel.time_delay_ == embedder_serial.time_delay_
+    assert embedder_parallel.dimension_ == embedder_serial.dimension_
+
+
+def test_embedder_constant_signal():
+    embedder = TakensEmbedding(parameters_type='search', time_delay=3,
+                               dimension=3)
+    embedder.fit(np.ones(100))
+
+    assert embedder.time_delay_ == 1
+
+
+def test_embedder_transform_stride():
+    embedder = TakensEmbedding(parameters_type='fixed', time_delay=2,
+                               dimension=2, stride=3)
+    X_embedded = embedder.fit_transform(np.arange(10))
+
+    assert_almost_equal(X_embedded, np.array([[1, 3], [4, 6], [7, 9]]))
+
+
+@pytest.mark.parametrize("time_delay", [1, 3, 7])
+def test_mutual_information(time_delay):
+    n_bins = 20
+    X = np.random.RandomState(0).randn(500)
+    X_binned = TakensEmbedding._bin(X, n_bins)
+    mutual_information = TakensEmbedding._mutual_information(
+        X_binned, time_delay, n_bins)
+
+    contingency = np.histogram2d(X[:-time_delay], X[time_delay:],
+                                 bins=n_bins,
+                                 range=[[X.min(), X.max()]] * 2)[0]
+    expected = mutual_info_score(None, None, contingency=contingency)
+
+    assert_almost_equal(mutual_information, expected)
+
+
+def test_fnn_count():
+    X = np.array([0., 3., 1., 4., 1., 5., 9., 2., 6., 20., 3., 5.])
+    indices = np.array([[0, 3], [1, 5], [2, 0], [3, 6], [4, 1], [5, 7],
+                        [6, 2], [7, 4]], dtype=np.int64)
+    distance = np.array([0.5, 0., 1., 3., 0.2, 0.4, 10., 0.3])
+    dim_by_delay, epsilon, tolerance = 2, 3., 4.
+
+    # Brute-force reference: every difference is tested against the
+    # distance of every point, as in the (n, n) criterion matrix
+    offset = X.shape[0] - distance.shape[0]
+    i = np.arange(distance.shape[0] - dim_by_delay)
+    d = distance[i]
+    diff = np.abs(X[offset + i + dim_by_delay] -
+                  X[indices[i + dim_by_delay, 1]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        is_false = diff[:, None] / d[None, :] > tolerance
+    expected = np.sum((d > 0) & (d < epsilon) & is_false)
+
+    # Distances 0. and 3. are excluded by d <= 0 and d >= epsilon
+    assert expected == 20
+    assert _fnn_count(X, indices, distance, dim_by_delay, epsilon,
+                      tolerance) == expected
+
+
 def test_window_params():
     window = SlidingWindow(width=0)
     with pytest.raises(ValueError):
         window.fit(signal)
+
+
+def test_window_not_fitted():
+    window = SlidingWindow()
+    with pytest.raises(NotFittedError):
+        window.transform(signal)
+
+
+def test_window_transform_not_finite():
+    X = np.arange(20.).reshape(-1, 2)
+    X[3, 1] = np.nan
+    windows = SlidingWindow(width=2, stride=3).fit(signal)
+    with pytest.raises(ValueError):
+        windows.transform(X)
+
+
+def test_window_transform():
+    X = np.arange(20).reshape(-1, 2)
+    windows = SlidingWindow(width=2, stride=3)
+    X_windows = windows.fit_transform(X)
+    expected = np.stack([X[1:4], X[4:7], X[7:10]])
+
+    assert_almost_equal(X_windows, expected)
+
+
+def test_window_resample():
+    y = np.arange(10)
+    windows = SlidingWindow(width=2, stride=3).fit(y)
+
+    assert_almost_equal(windows.resample(y), np.array([3, 6, 9]))
+
+
+def test_window_resample_set_params():
+    y = np.arange(10)
+    windows = SlidingWindow(width=2, stride=2).fit(y)
+    windows.set_params(width=1)
+
+    assert windows.resample(y).shape[0] == windows.transform(y).shape[0]
+
+
+@pytest.mark.parametrize("dimension, stride, expected",
+                         [(1, 1, np.arange(20)),
+                          (3, 2, np.arange(5, 20, 2))])
+def test_embedder_resample(dimension, stride, expected):
+    y = np.arange(20)
+    embedder = TakensEmbedding(parameters_type='fixed', time_delay=2,
+                               dimension=dimension, stride=stride)
+    embedder.fit(signal)
+
+    assert_almost_equal(embedder.resample(y), expected)